@@ -0,0 +1,129 @@
+import csv
+import math
+
+# Geocoding backends used by the location commands.  Only admin commands need
+# these, so nothing heavy (geopy, gazetteer file) is loaded until first lookup.
+
+# same attributes as geopy.location.Location so callers don't care which backend answered
+class Location(object):
+    def __init__(self, address, latitude, longitude):
+        self.address = address
+        self.latitude = latitude
+        self.longitude = longitude
+
+# parse 'lat,lon' (or 'lat lon') into a float pair, None if query is not coordinates
+def parse_latlon(query):
+    parts = query.replace(',', ' ').split()
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return (lat, lon)
+
+def format_latlon(lat, lon):
+    return "{},{}".format(lat, lon)
+
+# no lookups at all:  locations must be given as lat/lon pairs
+class NoGeocoder(object):
+    name = 'none'
+
+    def geocode(self, query):
+        latlon = parse_latlon(query)
+        if latlon is None:
+            return None
+        return Location(format_latlon(*latlon), latlon[0], latlon[1])
+
+    def reverse(self, latlon):
+        return Location(format_latlon(latlon[0], latlon[1]), latlon[0], latlon[1])
+
+# online lookups through OpenStreetMap Nominatim, geopy imported on first use
+class NominatimGeocoder(NoGeocoder):
+    name = 'nominatim'
+
+    def __init__(self, user_agent="osiris-ceph-mgr-cachetier"):
+        self.user_agent = user_agent
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from geopy.geocoders import Nominatim
+            self._client = Nominatim(user_agent=self.user_agent)
+        return self._client
+
+    def geocode(self, query):
+        location = super(NominatimGeocoder, self).geocode(query)
+        if location is not None:
+            return location
+        location = self.client.geocode(query)
+        if location is None:
+            return None
+        return Location(location.address, location.latitude, location.longitude)
+
+    def reverse(self, latlon):
+        location = self.client.reverse((latlon[0], latlon[1]))
+        if location is None:
+            return super(NominatimGeocoder, self).reverse(latlon)
+        return Location(location.address, location.latitude, location.longitude)
+
+# offline lookups from a CSV file of name,lat,lon rows, loaded on first use
+# names match case insensitively, reverse lookup returns the nearest entry
+class GazetteerGeocoder(NoGeocoder):
+    name = 'gazetteer'
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = None
+
+    @property
+    def entries(self):
+        if self._entries is None:
+            entries = dict()
+            with open(self.path) as f:
+                for row in csv.reader(f):
+                    if len(row) < 3 or row[0].startswith('#'):
+                        continue
+                    try:
+                        entries[row[0].strip().lower()] = Location(row[0].strip(), float(row[1]), float(row[2]))
+                    except ValueError:
+                        continue
+            self._entries = entries
+        return self._entries
+
+    def geocode(self, query):
+        location = super(GazetteerGeocoder, self).geocode(query)
+        if location is not None:
+            return location
+        return self.entries.get(query.strip().lower())
+
+    def reverse(self, latlon):
+        lat, lon = latlon[0], latlon[1]
+        nearest = None
+        nearest_dist = None
+        for entry in self.entries.values():
+            # equirectangular approximation is plenty to pick the closest name
+            x = math.radians(entry.longitude - lon) * math.cos(math.radians((entry.latitude + lat) / 2.0))
+            y = math.radians(entry.latitude - lat)
+            dist = x * x + y * y
+            if nearest_dist is None or dist < nearest_dist:
+                nearest, nearest_dist = entry, dist
+
+        if nearest is None:
+            return super(GazetteerGeocoder, self).reverse(latlon)
+        return Location(nearest.address, lat, lon)
+
+GEOCODERS = {
+    NoGeocoder.name: NoGeocoder,
+    NominatimGeocoder.name: NominatimGeocoder,
+    GazetteerGeocoder.name: GazetteerGeocoder,
+}
+
+# construct backend by name, raises KeyError for unknown backend
+def get_geocoder(name, gazetteer_file=None):
+    if name == GazetteerGeocoder.name:
+        return GazetteerGeocoder(gazetteer_file)
+    return GEOCODERS[name]()
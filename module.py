@@ -1,6 +1,7 @@
 import errno
 import logging
 import json
+import math
 import subprocess
 import time
 import textwrap
@@ -8,8 +9,9 @@ from threading import Event, Thread
 
 from mgr_module import MgrModule
 
-from geopy.geocoders import Nominatim   
-from geopy.distance import geodesic
+from .geocode import get_geocoder, NoGeocoder
+from .policy import PolicyTable, POLICY_OPTIONS, POLICY_TARGETS, empty_policies
+from .traffic import make_samples, aggregate_traffic, regions_from_store, regions_near, region_traffic, traffic_over_threshold
 
 # https://pythonhosted.org/python-geoip/
 # https://pypi.org/project/geopy/
@@ -44,6 +46,15 @@ class Module(MgrModule):
             'desc': "associate a backing pool with CRUSH rule to be used for cache pools",
             'perm': 'rw'
         },
+        {
+            'cmd': 'cache create crush '
+                   'name=crush_rule,type=CephString '
+                   'name=root,type=CephString '
+                   'name=failure_domain,type=CephString '
+                   'name=device_class,type=CephString,req=false ',
+            'desc': "create replicated CRUSH rule for cache pools, optionally limited to a device class (ssd, nvme, etc)",
+            'perm': 'rw'
+        },
         {
             'cmd': 'cache remove crush '
                    'name=crush_rule,type=CephString '
@@ -78,6 +89,28 @@ class Module(MgrModule):
             'desc': "Stop simulating high client traffic from specified location (specify lat,lon as listed in 'cache list location')",
             'perm': 'rw'
         },
+        {
+            'cmd': 'cache policy list',
+            'desc': 'List per pool and per crush rule policy overrides',
+            'perm': 'r'
+        },
+        {
+            'cmd': 'cache policy set '
+                   'name=target,type=CephChoices,strings=pool|crush '
+                   'name=name,type=CephString '
+                   'name=option,type=CephChoices,strings={} '
+                   'name=value,type=CephInt '.format('|'.join(POLICY_OPTIONS)),
+            'desc': "Override module option for a backing pool or crush rule (pool policy takes precedence over crush rule policy)",
+            'perm': 'rw'
+        },
+        {
+            'cmd': 'cache policy remove '
+                   'name=target,type=CephChoices,strings=pool|crush '
+                   'name=name,type=CephString '
+                   'name=option,type=CephChoices,strings={},req=false '.format('|'.join(POLICY_OPTIONS)),
+            'desc': "Remove policy override for a backing pool or crush rule (all options if none given)",
+            'perm': 'rw'
+        },
 
     ]
 
@@ -140,8 +173,39 @@ class Module(MgrModule):
         {
             'name': 'pg_num',
             'type': 'int',
+            'default': 0,
+            'desc': 'default pg_num for new cache pools, 0 to size from the OSDs under the crush rule and the expected cache size',
+            'runtime': True
+        },
+        {
+            'name': 'pg_autoscale',
+            'type': 'bool',
+            'default': True,
+            'desc': 'enable pg_autoscale_mode on new cache pools with automatically sized pg_num, with pg_num_min set to one pg per OSD and target_size_bytes set to the cache size',
+            'runtime': True
+        },
+        {
+            'name': 'geohash_precision',
+            'type': 'int',
             'default': 4,
-            'desc': 'default pg_num for new cache pools',
+            'min': 1,
+            'max': 12,
+            'desc': 'geohash length used to bucket client traffic before matching against locations.  Default 4 (cells roughly 24x12 miles)',
+            'runtime': True
+        },
+        {
+            'name': 'geocoder',
+            'type': 'str',
+            'default': 'nominatim',
+            'enum_allowed': ['nominatim', 'gazetteer', 'none'],
+            'desc': 'backend used to look up location names: nominatim (online, requires geopy), gazetteer (offline CSV file of name,lat,lon) or none (lat,lon pairs only)',
+            'runtime': True
+        },
+        {
+            'name': 'gazetteer_file',
+            'type': 'str',
+            'default': '',
+            'desc': 'path to CSV file of name,lat,lon rows used by the gazetteer geocoder',
             'runtime': True
         },
         {
@@ -156,15 +220,16 @@ class Module(MgrModule):
 
     def __init__(self, *args, **kwargs):
         super(Module, self).__init__(*args, **kwargs)
-        self.geolocator = Nominatim(user_agent="osiris-ceph-mgr-cachetier")
         self.interval = 60
         self.event = Event()
         self.workers = dict()
-        self.suffix = self.get_module_option('suffix')
-        self.cooldown = self.get_module_option('cooldown_duration')
-        self.proximity = self.get_module_option('proximity')
-        self.pg_num = self.get_module_option('pg_num')
         self.run = True
+        # module options and stored state are loaded on first use (config_notify / load_state)
+        # so mgr startup and failover don't wait on them
+        self.options_loaded = False
+        self.state = None
+        self._geocoder = None
+        self.policy_table = None
         # self.tasks = queue.Queue(maxsize=100)
         # queue for tasks
         # self.queue = Queue.Queue(maxsize=100)
@@ -176,6 +241,8 @@ class Module(MgrModule):
 
     def serve(self):
         self.log.info('Starting cachetier module')
+        self.config_notify()
+        self.load_state()
         while self.run:
             self.poll_traffic()
             self.manage_cache()
@@ -187,7 +254,60 @@ class Module(MgrModule):
         self.run = False
         self.event.set()
             
+    def config_notify(self):
+        for opt in self.MODULE_OPTIONS:
+            setattr(self, opt['name'], self.get_module_option(opt['name']))
+            self.log.debug(' %s = %s', opt['name'], getattr(self, opt['name']))
+
+        # rebuild geocoder on next lookup if backend or gazetteer file changed
+        if self._geocoder is not None and (self._geocoder.name != self.geocoder or
+                                           getattr(self._geocoder, 'path', self.gazetteer_file) != self.gazetteer_file):
+            self._geocoder = None
+
+        # module options are the policy defaults
+        self.policy_table = None
+
+        self.options_loaded = True
+
+    # resolved policy options for a backing pool and/or crush rule
+    # table is compiled on first use after policies, pool associations or module options change
+    def policy(self, pool=None, crush_rule=None):
+        if not self.options_loaded:
+            self.config_notify()
+
+        if self.policy_table is None:
+            defaults = dict((opt, getattr(self, opt)) for opt in POLICY_OPTIONS)
+            stored_policies = self.fetch('policies')
+            self.policy_table = PolicyTable(defaults, stored_policies, self.fetch('cache_assoc'))
+
+        return self.policy_table.get(pool, crush_rule)
+
+    # geocoding backend, constructed on first use.  Backends import their own dependencies
+    # lazily so a missing geopy only affects lookups, not module load
+    @property
+    def geolocator(self):
+        if not self.options_loaded:
+            self.config_notify()
+
+        if self._geocoder is None:
+            try:
+                geocoder = get_geocoder(self.geocoder, gazetteer_file=self.gazetteer_file)
+                # fail here rather than on lookup so we can fall back
+                if geocoder.name == 'nominatim':
+                    geocoder.client
+                elif geocoder.name == 'gazetteer':
+                    geocoder.entries
+            except (ImportError, KeyError, IOError, OSError) as e:
+                self.log.error("Geocoder {} unavailable ({}), only lat,lon locations will be accepted".format(self.geocoder, e))
+                geocoder = NoGeocoder()
+            self._geocoder = geocoder
+
+        return self._geocoder
+
     def handle_command(self, inbuf, cmd):
+        if not self.options_loaded:
+            self.config_notify()
+
         handler_name = "_cmd_" + cmd['prefix'].replace(" ", "_")
         try:
             handler = getattr(self, handler_name)
@@ -274,6 +394,24 @@ class Module(MgrModule):
 
         return (0, '', ret)
 
+    def _cmd_cache_create_crush(self,inbuf,cmd):
+        rule_cmd = {
+            "prefix": "osd crush rule create-replicated",
+            "name": cmd['crush_rule'],
+            "root": cmd['root'],
+            "type": cmd['failure_domain']
+        }
+        if cmd.get('device_class'):
+            rule_cmd['class'] = cmd['device_class']
+
+        rcode, stdout, errstr = self.mon_command(rule_cmd)
+        if rcode != 0:
+            return (rcode, '', "Creating crush rule {} failed: {}".format(cmd['crush_rule'], errstr))
+
+        return (0, '', "Created crush rule {} under {} with failure domain {}{}"
+                .format(cmd['crush_rule'], cmd['root'], cmd['failure_domain'],
+                        " limited to device class {}".format(cmd['device_class']) if cmd.get('device_class') else ''))
+
     # return 3-tuple result code, output buffer, informative string
     def _cmd_cache_add_crush(self,inbuf,cmd):
 
@@ -294,7 +432,7 @@ class Module(MgrModule):
                 for rule in crushmap['rules']:
                     if rule['rule_name'] == cmd['crush_rule']:
                         stored_pools.setdefault(cmd['pool_name'],[]).append(cmd['crush_rule'])
-                        self.set_store('cache_assoc', json.dumps(stored_pools))
+                        self.store('cache_assoc', stored_pools)
                         return (0,"","Associated {} with crush rule {} for cache overlays".format(cmd['pool_name'],cmd['crush_rule']))
         return (-errno.EINVAL, "", "Pool or crush rule does not exist")
 
@@ -318,7 +456,7 @@ class Module(MgrModule):
         if 'proximity' in cmd:
             setprox = cmd['proximity']
         else:
-            setprox = self.proximity
+            setprox = self.policy(crush_rule=cmd['crush_rule'])['proximity']
 
         if cmd['crush_rule'] in stored_loc:
             for lat,lon,prox in stored_loc[cmd['crush_rule']]:
@@ -357,6 +495,62 @@ class Module(MgrModule):
             return(0,"","Enabled cache creation for crush root {}".format(cmd['crush_rule']))
         return(-errno.EINVAL, '',"Crush root {} not found".format(cmd['crush_rule'])) 
 
+    def _cmd_cache_policy_list(self,inbuf,cmd):
+        stored_policies = self.fetch('policies')
+        ret = ''
+        ret += self.get_pretty_header(('Target', 'Name', 'Option', 'Value'), 80)
+        for target in POLICY_TARGETS:
+            for name in stored_policies.get(target, dict()):
+                for option, value in sorted(stored_policies[target][name].items()):
+                    ret += self.get_pretty_row((target, name, option, value), 80) + '\n'
+        ret += self.get_pretty_footer(80)
+        return (0, '', ret)
+
+    def _cmd_cache_policy_set(self,inbuf,cmd):
+        if cmd['option'] not in POLICY_OPTIONS:
+            return (-errno.EINVAL, '', "Option {} can not be set per {}".format(cmd['option'], cmd['target']))
+
+        # proximity is stored per location when it is associated with a crush rule, there is no pool to apply it to
+        if cmd['option'] == 'proximity' and cmd['target'] == 'pool':
+            return (-errno.EINVAL, '', "Option proximity can only be set per crush rule")
+
+        if cmd['value'] < 0:
+            return (-errno.EINVAL, '', "Option {} must not be negative".format(cmd['option']))
+
+        if cmd['target'] == 'pool':
+            exists = any(pool['pool_name'] == cmd['name'] for pool in self.get_osdmap().get_pools().values())
+        else:
+            exists = any(rule['rule_name'] == cmd['name'] for rule in self.get_osdmap().get_crush().dump()['rules'])
+        if not exists:
+            return (-errno.ENOENT, '', "{} {} does not exist".format(cmd['target'], cmd['name']))
+
+        stored_policies = self.fetch('policies')
+        if not stored_policies:
+            stored_policies = empty_policies()
+        stored_policies[cmd['target']].setdefault(cmd['name'], dict())[cmd['option']] = cmd['value']
+        self.store('policies', stored_policies)
+        return (0, '', "Set {} to {} for {} {}".format(cmd['option'], cmd['value'], cmd['target'], cmd['name']))
+
+    def _cmd_cache_policy_remove(self,inbuf,cmd):
+        stored_policies = self.fetch('policies')
+        overrides = stored_policies.get(cmd['target'], dict()).get(cmd['name'])
+        if overrides is None:
+            return (-errno.ENOENT, '', "No policy set for {} {}".format(cmd['target'], cmd['name']))
+
+        option = cmd.get('option')
+        if option:
+            if option not in overrides:
+                return (-errno.ENOENT, '', "Option {} not set for {} {}".format(option, cmd['target'], cmd['name']))
+            del overrides[option]
+        else:
+            overrides.clear()
+
+        if not overrides:
+            del stored_policies[cmd['target']][cmd['name']]
+
+        self.store('policies', stored_policies)
+        return (0, '', "Removed {} policy for {} {}".format(option or 'all', cmd['target'], cmd['name']))
+
     # set overide in datastore, will be picked up by traffic poller and applied
     def _cmd_cache_simulate_location(self,inbuf,cmd):
         return self.cache_simulate_location(cmd['location'], enable=True)
@@ -414,62 +608,71 @@ class Module(MgrModule):
 
         # we only care about crush rules that have pool associations
 
+        # bucket client traffic by geohash and match the buckets (not individual clients) against stored locations
+        samples = self.collect_traffic()
+        buckets = aggregate_traffic(samples, self.geohash_precision)
+        regions, region_keys = regions_from_store(stored_loc)
+        region_index = dict((key, i) for i, key in enumerate(region_keys))
+        traffic = region_traffic(buckets, regions)
+        total_traffic = buckets['bytes'].sum()
+        override_triggered = set(key for key, near in zip(region_keys, regions_near(stored_override, regions)) if near)
+
+        self.log.info("poll_traffic: {} client samples aggregated into {} geohash buckets, {} bytes/s total"
+                      .format(len(samples), len(buckets), total_traffic))
+
         for pool in stored_pools:
             for crush in stored_pools[pool]:
                 self.log.info("poll_traffic: pool {}: associated cache crush rule {} being checked for any location association ".format(pool, crush))
                 if crush in stored_loc:
-                    for loclist in stored_loc[crush]:
+                    policy = self.policy(pool, crush)
+                    for idx, loclist in enumerate(stored_loc[crush]):
                         lat = loclist[0]
                         lon = loclist[1]
                         prox = loclist[2]
                         self.log.info("poll_traffic: pool {}: cache crush rule {} has association with location {},{} ".format(pool, crush, lat,lon))
 
-                        #  pseudo code block for doing this with actual network data
-                        #  query:  traffic to OSD which are included in a crush rule associated with a location proximity
-                        #  filter: sum of all traffic by location exceeding threshold
-                        #  if location exceeds configured threshold add coordinates to network_locations list
-                        #  combine that list with user over-ride locations 
-                        #  iterate through list and trigger cache startup state if a crush rule -> location association exists within proximity
-                        #  any crush rule -> location associations not in list need to be marked as teardown if past timeout
-
-                        # ... but right now there is no real network data to include
-                        network_locations = []
-                        trigger_locations = stored_override + network_locations
-
                         # mark active caches for teardown if cooldown exceeded (will be over-ridden by location trigger check)
                         if crush in stored_active:
                             for cache_info in stored_active[crush]:
-                                if cache_info['state'] == 'active' and (time.time() - cache_info['timestamp'] > self.cooldown):
+                                if cache_info['state'] == 'active' and (time.time() - cache_info['timestamp'] > self.cooldown_duration):
                                     self.log.info("poll_trafic: cache pool {}: cooldown expired, marking for teardown".format(cache_info['cache_pool']))
                                     cache_info['state'] = 'teardown'
 
-
-                        # check list of trigger locations and activate new caches if necessary
-                        for location in trigger_locations:
-                            distance = geodesic((lat,lon), location)
-
-                            # is the overide location within specified proximity to any stored location/crush association?
-                            if distance <= prox:
-                                self.log.info("poll_traffic: location {},{} triggered cache activation for pool {} using crush rule {}".format(lat,lon, pool, crush))
-                                if crush in stored_active:
-                                    for cache_info in stored_active[crush]:
-                                        if cache_info['state'] == 'active':
-                                            self.log.info("poll_traffic: Pool {} is already active".format(cache_info['cache_pool']))
-                                            # reset timestamp used for cooldown 
-                                            cache_info['timestamp'] = time.time()
-                                            continue
-                                        else:
-                                            self.log.info("poll_traffic: Pool {} changed from state {} to state {}".format(cache_info['cache_pool'], cache_info['state'], 'startup'))
-                                            cache_info['timestamp'] = time.time()
-                                            cache_info['state'] = 'startup'
-                                else:
-                                    self.log.info("poll_traffic: Pool {} in crush {} added to stored status object with state 'startup'".format("{}{}".format(pool, self.suffix), crush))
-                                    stored_active[crush] = [{'backing_pool': pool, 'cache_pool': "{}{}".format(pool, self.suffix) , 'state': 'startup', 'timestamp': time.time() }]
+                        # location triggers if client traffic within proximity exceeded the pool thresholds
+                        # or any user over-ride location is within proximity
+                        triggered = (crush, idx) in override_triggered or bool(traffic_over_threshold(
+                            traffic[region_index[(crush, idx)]], total_traffic,
+                            threshold_bytes=policy['traffic_threshold_bytes'],
+                            threshold_ratio=policy['traffic_threshold_ratio']))
+
+                        if triggered:
+                            self.log.info("poll_traffic: location {},{} triggered cache activation for pool {} using crush rule {}".format(lat,lon, pool, crush))
+                            if crush in stored_active:
+                                for cache_info in stored_active[crush]:
+                                    if cache_info['state'] == 'active':
+                                        self.log.info("poll_traffic: Pool {} is already active".format(cache_info['cache_pool']))
+                                        # reset timestamp used for cooldown 
+                                        cache_info['timestamp'] = time.time()
+                                        continue
+                                    else:
+                                        self.log.info("poll_traffic: Pool {} changed from state {} to state {}".format(cache_info['cache_pool'], cache_info['state'], 'startup'))
+                                        cache_info['timestamp'] = time.time()
+                                        cache_info['state'] = 'startup'
+                            else:
+                                self.log.info("poll_traffic: Pool {} in crush {} added to stored status object with state 'startup'".format("{}{}".format(pool, self.suffix), crush))
+                                stored_active[crush] = [{'backing_pool': pool, 'cache_pool': "{}{}".format(pool, self.suffix) , 'state': 'startup', 'timestamp': time.time() }]
 
         # the only thing we change here is the cache active status
         self.log.info("poll_traffic: storing new changes to cache status")
         self.store('cache_active', stored_active)
 
+    # client traffic samples (lat, lon, bytes/s) for the current poll cycle
+    #  query:  traffic to OSD which are included in a crush rule associated with a location
+    #  lookup: client address -> lat/lon (geoip)
+    # ... but right now there is no real network data to include
+    def collect_traffic(self):
+        return make_samples()
+
     def manage_cache(self):
         self.log.info("manage_cache: starting loop through status object")
         
@@ -538,27 +741,84 @@ class Module(MgrModule):
         self.log.info("Storing current cache_active status {}".format(stored_active))
         self.store('cache_active', stored_active)
 
+    # OSD ids and total capacity in bytes under the root of a crush rule
+    # device class rules take a shadow root (default~ssd) so only OSDs of that class are counted
+    def crush_rule_osds(self, crush_rule):
+        crush = self.get_osdmap().get_crush()
+        root_id = crush.get_rule_root(crush_rule)
+        if root_id is None:
+            return [], 0
+
+        osds = crush.get_osds_under(root_id)
+        osd_bytes = dict((stat['osd'], stat.get('kb', 0) * 1024) for stat in self.get('osd_stats').get('osd_stats', []))
+        return osds, sum(osd_bytes.get(osd, 0) for osd in osds)
+
+    # choose pg_num for a new cache pool, like the pg autoscaler would:
+    #   target = osd count * mon_target_pg_per_osd * fraction of rule capacity the tier will use / size
+    # rounded to a power of two, but never fewer pgs than OSDs so every OSD under the rule
+    # takes a share of the load as soon as the tier exists
+    # returns (pg_num, pg_num_min), pg_num_min is the one pg per OSD floor or None if no OSDs were found
+    def autosize_pg_num(self, crush_rule, size, max_bytes):
+        osds, capacity = self.crush_rule_osds(crush_rule)
+        if not osds:
+            pg_num = self.get_ceph_option('osd_pool_default_pg_num') or 8
+            self.log.warning("autosize_pg_num: no OSDs found under crush rule {}, using pg_num {}".format(crush_rule, pg_num))
+            return pg_num, None
+
+        ratio = None
+        target = 0
+        if capacity > 0:
+            ratio = min(1.0, float(max_bytes) * size / capacity)
+            target_per_osd = self.get_ceph_option('mon_target_pg_per_osd') or 100
+            target = len(osds) * target_per_osd * ratio / size
+
+        # smallest power of two covering every OSD, or the nearest power of two to target if larger
+        pg_num_min = 2 ** int(math.ceil(math.log(len(osds), 2)))
+        pg_num = pg_num_min
+        if target > pg_num:
+            pg_num = 2 ** int(round(math.log(target, 2)))
+
+        self.log.info("autosize_pg_num: crush rule {}: {} OSDs, {} bytes capacity, cache {} bytes x{} -> ratio {}, pg_num {} (min {})"
+                      .format(crush_rule, len(osds), capacity, max_bytes, size, ratio, pg_num, pg_num_min))
+        return pg_num, pg_num_min
+
     # at this point I'm not quite sure how to check if a cache pool is actually 
     # configured as an overlay so the best we can do is check that it exists 
-    # if ecprofile is provided then the pool type argument automatically changes to erasure
-    # if pg_num is not provided the module global default setting is used
+    # ceph does not allow erasure coded pools as cache tiers, ecprofile is refused
+    # (the backing pool may be erasure coded)
+    # settings not provided come from the pool / crush rule policy (module options if no policy is set)
+    # pg_num of 0 is sized from the OSDs under the crush rule, see autosize_pg_num.  Only autosized pools
+    # are handed to the pg autoscaler, an explicit pg_num from a policy or argument is left as given
     def create_cache(self,cache_pool,backing_pool,crush_rule, pg_num=None,ecprofile=None, size=None, min_size=None, max_bytes=None, max_objects=None):
         self.log.info("create_cache: pool: {}, cache: {}, crush: {}".format(backing_pool,cache_pool, crush_rule))
 
+        if ecprofile:
+            self.log.error("Pool creation failed for cache pool {}: erasure coded pools (profile {}) can not be cache tiers".format(cache_pool, ecprofile))
+            return False
+
+        policy = self.policy(backing_pool, crush_rule)
+
         if size == None:
-            size = self.get_module_option('size')
+            size = policy['size']
 
         if min_size == None:
-            min_size = self.get_module_option('min_size')
+            min_size = policy['min_size']
 
         if pg_num == None:
-            pg_num = self.get_module_option('pg_num')
+            pg_num = policy['pg_num']
 
+        # option is in MB
         if max_bytes == None:
-            max_bytes = self.get_module_option('default_cache_size')
+            max_bytes = policy['default_cache_size'] * 1024 * 1024
 
         if max_objects == None:
-            max_objects = self.get_module_option('default_cache_objects')
+            max_objects = policy['default_cache_objects']
+
+        autoscale = False
+        pg_num_min = None
+        if not pg_num:
+            pg_num, pg_num_min = self.autosize_pg_num(crush_rule, size, max_bytes)
+            autoscale = self.pg_autoscale
 
         writeback = 'writeback'
 
@@ -571,10 +831,6 @@ class Module(MgrModule):
                 "size": size
         }
 
-        if ecprofile:
-            pool_cmd['erasure_code_profile'] = ecprofile
-            pool_cmd['pool_type'] = 'erasure'
-
         pool_min_size = {
             "prefix": "osd pool set",
             "pool": cache_pool,
@@ -614,7 +870,7 @@ class Module(MgrModule):
             "val":  str(max_bytes)
         }
 
-        run_cmds = (pool_cmd, pool_min_size, tier_add, cache_mode, set_overlay, hit_set, max_bytes_cmd)
+        run_cmds = [pool_cmd, pool_min_size, tier_add, cache_mode, set_overlay, hit_set, max_bytes_cmd]
 
         if max_objects > 0:
             max_objects_cmd = {
@@ -626,6 +882,31 @@ class Module(MgrModule):
 
             run_cmds.append(max_objects_cmd)
 
+        # keep the autoscaler from shrinking below one pg per OSD, and give it the expected
+        # size in bytes (a ratio would be normalized against other pools' ratios)
+        if autoscale:
+            if pg_num_min:
+                run_cmds.append({
+                    "prefix": "osd pool set",
+                    "pool": cache_pool,
+                    "var": "pg_num_min",
+                    "val": str(pg_num_min)
+                })
+
+            run_cmds.append({
+                "prefix": "osd pool set",
+                "pool": cache_pool,
+                "var": "target_size_bytes",
+                "val": str(max_bytes)
+            })
+
+            run_cmds.append({
+                "prefix": "osd pool set",
+                "pool": cache_pool,
+                "var": "pg_autoscale_mode",
+                "val": "on"
+            })
+
         rcode = 0
         i = 0
         while rcode == 0 and i < len(run_cmds):
@@ -700,9 +981,17 @@ class Module(MgrModule):
         self.log.info("Removed cache tier {} from pool {}".format(cache_pool, backing_pool))
         return True
 
+    # read all stored module state in one batched call.  Values are kept as json strings
+    # so every fetch hands out a fresh copy that callers can modify freely
+    def load_state(self):
+        self.state = dict(self.get_store_prefix(''))
+        self.log.info("load_state: restored {} stored keys".format(len(self.state)))
+
     # fetch json dicts or lists from datastore or initialize for use if not yet stored
     def fetch(self,storekey, default = 'dict'):
-        stored = self.get_store(storekey)
+        if self.state is None:
+            self.load_state()
+        stored = self.state.get(storekey)
         if stored == None:
             if default == 'list':
                 stored = list() 
@@ -715,7 +1004,12 @@ class Module(MgrModule):
 
     # store dict into datastore 
     def store(self,storekey,data):
-        self.set_store(storekey, json.dumps(data))
+        if self.state is None:
+            self.load_state()
+        self.state[storekey] = json.dumps(data)
+        self.set_store(storekey, self.state[storekey])
+        if storekey in ('policies', 'cache_assoc'):
+            self.policy_table = None
 
 #
 #
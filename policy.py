@@ -0,0 +1,59 @@
+# Per-pool and per-crush-rule overrides of the cache tier module options.
+#
+# Stored in the KV store under 'policies' as
+#   {'pool': {pool_name: {option: value}}, 'crush': {rule_name: {option: value}}}
+# Precedence is pool policy, then crush rule policy, then module option.
+
+# module options which may be overridden per pool or crush rule
+POLICY_OPTIONS = (
+    'traffic_threshold_bytes',
+    'traffic_threshold_ratio',
+    'proximity',
+    'size',
+    'min_size',
+    'pg_num',
+    'default_cache_size',
+    'default_cache_objects',
+)
+
+POLICY_TARGETS = ('pool', 'crush')
+
+def empty_policies():
+    return {target: dict() for target in POLICY_TARGETS}
+
+# policies are compiled once into fully resolved option dicts so lookups during
+# polling and pool creation are a single dict access regardless of how many
+# pools, rules or overrides exist
+class PolicyTable(object):
+    def __init__(self, defaults, stored_policies, stored_pools):
+        self.defaults = dict(defaults)
+        self.pool_policies = stored_policies.get('pool', dict())
+
+        self.by_crush = dict()
+        for crush_rule, overrides in stored_policies.get('crush', dict()).items():
+            self.by_crush[crush_rule] = self.merge(self.defaults, overrides)
+
+        # every backing pool / cache crush rule association poll_traffic will ask about
+        self.by_pair = dict()
+        for pool in stored_pools:
+            for crush_rule in stored_pools[pool]:
+                self.by_pair[(pool, crush_rule)] = self.resolve(pool, crush_rule)
+
+    @staticmethod
+    def merge(base, overrides):
+        merged = dict(base)
+        merged.update((k, v) for k, v in overrides.items() if k in POLICY_OPTIONS)
+        return merged
+
+    def resolve(self, pool=None, crush_rule=None):
+        base = self.by_crush.get(crush_rule, self.defaults)
+        if pool in self.pool_policies:
+            return self.merge(base, self.pool_policies[pool])
+        return base
+
+    # resolved options for pool and/or crush rule
+    def get(self, pool=None, crush_rule=None):
+        try:
+            return self.by_pair[(pool, crush_rule)]
+        except KeyError:
+            return self.resolve(pool, crush_rule)
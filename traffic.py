@@ -0,0 +1,136 @@
+import numpy as np
+
+# client traffic samples as reported for one poll cycle
+SAMPLE_DTYPE = np.dtype([('lat', 'f8'), ('lon', 'f8'), ('bytes', 'f8')])
+
+# aggregated traffic per geohash cell:  lat/lon is the traffic weighted centroid of the clients in the cell
+BUCKET_DTYPE = np.dtype([('geohash', 'i8'), ('lat', 'f8'), ('lon', 'f8'), ('bytes', 'f8'), ('clients', 'i8')])
+
+# crush rule -> location associations flattened for matching (see regions_from_store)
+REGION_DTYPE = np.dtype([('lat', 'f8'), ('lon', 'f8'), ('prox', 'f8')])
+
+EARTH_RADIUS_MILES = 3958.8
+
+# 12 characters is the longest standard geohash and fits in 60 bits
+MAX_PRECISION = 12
+
+# build an empty or populated sample array from (lat, lon, bytes/s) tuples
+def make_samples(samples=()):
+    return np.array(list(samples), dtype=SAMPLE_DTYPE)
+
+# integer geohash for arrays of coordinates
+# bits are interleaved lon/lat exactly as in the base32 string form, so a shorter
+# precision is a prefix of a longer one: key >> (5 * (p1 - p2)) gives the p2 cell
+def geohash_encode(lat, lon, precision=4):
+    if precision < 1 or precision > MAX_PRECISION:
+        raise ValueError("geohash precision must be between 1 and {}".format(MAX_PRECISION))
+
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+
+    lat = np.asarray(lat, dtype='f8')
+    lon = np.asarray(lon, dtype='f8')
+
+    # cell index along each axis, clipped so lat 90 / lon 180 land in the last cell
+    lat_idx = np.clip(np.floor((lat + 90.0) / 180.0 * (1 << lat_bits)), 0, (1 << lat_bits) - 1).astype('i8')
+    lon_idx = np.clip(np.floor((lon + 180.0) / 360.0 * (1 << lon_bits)), 0, (1 << lon_bits) - 1).astype('i8')
+
+    # geohash starts with a lon bit and alternates, most significant first
+    key = np.zeros_like(lat_idx)
+    for i in range(bits):
+        if i % 2 == 0:
+            bit = (lon_idx >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_idx >> (lat_bits - 1 - i // 2)) & 1
+        key = (key << 1) | bit
+
+    return key
+
+# sum client traffic per geohash cell in one pass
+# result size is bounded by number of distinct cells, not number of clients
+def aggregate_traffic(samples, precision=4):
+    if len(samples) == 0:
+        return np.zeros(0, dtype=BUCKET_DTYPE)
+
+    keys = geohash_encode(samples['lat'], samples['lon'], precision)
+    cells, inverse = np.unique(keys, return_inverse=True)
+    weights = samples['bytes']
+
+    buckets = np.zeros(len(cells), dtype=BUCKET_DTYPE)
+    buckets['geohash'] = cells
+    buckets['bytes'] = np.bincount(inverse, weights=weights, minlength=len(cells))
+    buckets['clients'] = np.bincount(inverse, minlength=len(cells))
+
+    # weighted centroid, fall back to plain mean for cells with no traffic
+    lat_sum = np.bincount(inverse, weights=samples['lat'] * weights, minlength=len(cells))
+    lon_sum = np.bincount(inverse, weights=samples['lon'] * weights, minlength=len(cells))
+    lat_mean = np.bincount(inverse, weights=samples['lat'], minlength=len(cells)) / buckets['clients']
+    lon_mean = np.bincount(inverse, weights=samples['lon'], minlength=len(cells)) / buckets['clients']
+
+    has_bytes = buckets['bytes'] > 0
+    safe_bytes = np.where(has_bytes, buckets['bytes'], 1.0)
+    buckets['lat'] = np.where(has_bytes, lat_sum / safe_bytes, lat_mean)
+    buckets['lon'] = np.where(has_bytes, lon_sum / safe_bytes, lon_mean)
+
+    return buckets
+
+# flatten stored loc_assoc (crush -> [[lat,lon,prox],...]) into a region array
+# returns the array and a parallel list of (crush_rule, index in stored list)
+def regions_from_store(stored_loc):
+    keys = list()
+    rows = list()
+    for crush_rule in stored_loc:
+        for idx, (lat, lon, prox) in enumerate(stored_loc[crush_rule]):
+            keys.append((crush_rule, idx))
+            rows.append((lat, lon, prox))
+
+    return np.array(rows, dtype=REGION_DTYPE), keys
+
+# great circle distance in miles between every bucket and every region (buckets x regions)
+def distance_matrix(buckets, regions):
+    lat1 = np.radians(buckets['lat'])[:, np.newaxis]
+    lon1 = np.radians(buckets['lon'])[:, np.newaxis]
+    lat2 = np.radians(regions['lat'])[np.newaxis, :]
+    lon2 = np.radians(regions['lon'])[np.newaxis, :]
+
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+# total bytes/s from buckets within proximity of each region
+def region_traffic(buckets, regions):
+    if len(buckets) == 0 or len(regions) == 0:
+        return np.zeros(len(regions), dtype='f8')
+
+    within = distance_matrix(buckets, regions) <= regions['prox'][np.newaxis, :]
+    return np.dot(buckets['bytes'], within)
+
+# mask of regions with any of the given [lat, lon] points within proximity
+def regions_near(points, regions):
+    if len(points) == 0 or len(regions) == 0:
+        return np.zeros(len(regions), dtype=bool)
+
+    points = np.asarray(points, dtype='f8').reshape(-1, 2)
+    located = np.zeros(len(points), dtype=[('lat', 'f8'), ('lon', 'f8')])
+    located['lat'] = points[:, 0]
+    located['lon'] = points[:, 1]
+    return (distance_matrix(located, regions) <= regions['prox'][np.newaxis, :]).any(axis=0)
+
+# whether region traffic (scalar or array) exceeds thresholds
+# total: all client traffic this cycle
+# threshold_bytes: minimum bytes/s from the region, None to ignore
+# threshold_ratio: minimum ratio of region traffic to all other traffic, None to ignore
+def traffic_over_threshold(traffic, total, threshold_bytes=None, threshold_ratio=None):
+    traffic = np.asarray(traffic, dtype='f8')
+    if threshold_bytes is None and threshold_ratio is None:
+        return np.zeros_like(traffic, dtype=bool)
+
+    triggered = traffic > 0
+
+    if threshold_bytes is not None:
+        triggered &= traffic >= threshold_bytes
+
+    if threshold_ratio is not None:
+        triggered &= traffic >= threshold_ratio * (total - traffic)
+
+    return triggered